@@ -3,15 +3,43 @@ from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet, ethernet, ether_types, arp
+from ryu.lib import addrconv, hub
+from ryu.lib.packet import ether_types
 from ryu.topology import event
 from ryu.topology.api import get_switch, get_link, get_host
 from ryu.app.wsgi import ControllerBase, WSGIApplication, route
 from webob import Response
+from collections import OrderedDict
+from time import monotonic
 import json
 
+try:
+    import orjson
+except ImportError: # Optional, the stdlib encoder is used as fallback
+    orjson = None
+
 api_instance_name = 'api_app'
 
+FLOW_IDLE_TIMEOUT = 30 # Seconds before an unused learned flow expires
+INSTALLED_FLOWS_MAX = 8192 # Learned flows remembered to suppress duplicate FlowMods
+
+TOPOLOGY_FLUSH_DELAY = 0.1 # Seconds to coalesce topology resync requests
+HOST_REFRESH_INTERVAL = 1 # Seconds between checks for host changes the topology app makes without events
+
+PACKET_IN_WORKERS = 4 # Greenthreads processing packet-ins, sharded by dpid
+PACKET_IN_QUEUE_SIZE = 1024 # Total packet-ins waiting across all workers before dropping
+PACKET_IN_DROP_LOG_INTERVAL = 10 # Seconds between warnings about dropped packet-ins
+
+# Rate-limit table-miss packet-ins in the switch. Off by default: OVS kernel datapaths often lack meter
+# support, if a switch rejects the meter the table-miss flow is reinstalled without it
+PACKET_IN_METER = False
+PACKET_IN_METER_ID = 1
+PACKET_IN_RATE = 1000 # Packets per second
+PACKET_IN_BURST = 200
+
+ETH_TYPE_LLDP = ether_types.ETH_TYPE_LLDP.to_bytes(2, 'big') # Raw ethertype bytes (0x88cc)
+ETH_TYPE_ARP = ether_types.ETH_TYPE_ARP.to_bytes(2, 'big') # Raw ethertype bytes (0x0806)
+
 class NetworkController(app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
     _CONTEXTS = {'wsgi': WSGIApplication}
@@ -21,15 +49,34 @@ class NetworkController(app_manager.RyuApp):
 
         self.topology = {
             'switches': {},
-            'links': [],
+            'links': {}, # (src_dpid, src_port, dst_dpid, dst_port) -> link, served as a list
             'hosts': {},
             'version': 0
         }
         
-        self.mac_to_port = {} # MAC to port mapping for each switch
+        self.mac2port = {} # (dpid, raw 6-byte MAC) -> port mapping, flat across all switches
+        self._installed = OrderedDict() # LRU of flows sent to switches: (dpid, raw eth_dst) -> (out_port, send time)
         
         self.datapaths = {} # Track datapaths
         
+        self.flood_actions = {} # dpid -> prebuilt [OFPActionOutput(OFPP_FLOOD)], reused by every flood
+        
+        self.api_cache = {} # Serialized REST responses keyed by (route, topology version)
+        self._fragments = {'switches': {}, 'links': {}, 'hosts': {}} # Pre-encoded JSON of every topology entry
+        
+        self._topo_dirty = False # A full topology resync is pending
+        self._topo_flush_scheduled = False
+        
+        # Packet-in work queues, one per worker so each switch keeps its ordering
+        self._pkt_queues = [hub.Queue(maxsize=PACKET_IN_QUEUE_SIZE // PACKET_IN_WORKERS) for _ in range(PACKET_IN_WORKERS)]
+        self._pkt_drops = 0 # Packet-ins dropped because their queue was full
+        self._pkt_drops_logged = 0 # Drop count at the last warning
+        self._pkt_drop_log_time = None
+        for queue in self._pkt_queues:
+            hub.spawn(self._pkt_worker, queue)
+        
+        hub.spawn(self._host_refresh_loop)
+        
         # Register REST API
         wsgi = kwargs['wsgi']
         wsgi.register(
@@ -43,209 +90,478 @@ class NetworkController(app_manager.RyuApp):
         
         if ev.state == MAIN_DISPATCHER: # Negotiation between RYU and OF Switch must be completed
             if datapath.id not in self.datapaths:
-                self.logger.info(f"Switch datapath id {datapath.id} CONNECTED")
+                self.logger.info("Switch datapath id %s CONNECTED", datapath.id)
                 self.datapaths[datapath.id] = datapath
         elif ev.state == DEAD_DISPATCHER:
             if datapath.id in self.datapaths:
-                self.logger.warning(f"Switch datapath id {datapath.id} DISCONNECTED")
+                self.logger.warning("Switch datapath id %s DISCONNECTED", datapath.id)
                 del self.datapaths[datapath.id]
+                self.flood_actions.pop(datapath.id, None)
+                # Flows may not survive a reconnection, install them again when needed
+                for key in [key for key in self._installed if key[0] == datapath.id]:
+                    del self._installed[key]
     
     # Code source: https://osrg.github.io/ryu-book/en/html/switching_hub.html
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER) # Waiting to receive SwitchFeatures message
     def switch_features_handler(self, ev): # Handle OF switch connection
         try: # RYU gets this reply from a previously sent request to the switch
             datapath = ev.msg.datapath 
+            hub.spawn(self._configure_switch, datapath) # Switches connecting together are configured concurrently
+        except Exception as e:
+            self.logger.error("Error in switch_features_handler: %s", e)
+            self.logger.exception(e)
+    
+    def _configure_switch(self, datapath): # Install meter and table-miss flow on a new switch
+        try:
             ofproto = datapath.ofproto
             parser = datapath.ofproto_parser
             
-            self.logger.info(f"Configuring switch datapath id {datapath.id}")
+            self.logger.info("Configuring switch datapath id %s", datapath.id)
             
-            # Install table-miss flow entry
-            match = parser.OFPMatch()
-            actions = [parser.OFPActionOutput(
-                ofproto.OFPP_CONTROLLER,
-                ofproto.OFPCML_NO_BUFFER
-            )]
-            self.add_flow(datapath, 0, match, actions)
+            meter_id = None
+            if PACKET_IN_METER: # The meter must exist before a flow references it
+                datapath.send_msg(parser.OFPMeterMod(
+                    datapath, command=ofproto.OFPMC_ADD, flags=ofproto.OFPMF_PKTPS,
+                    meter_id=PACKET_IN_METER_ID,
+                    bands=[parser.OFPMeterBandDrop(rate=PACKET_IN_RATE, burst_size=PACKET_IN_BURST)]
+                ))
+                meter_id = PACKET_IN_METER_ID
             
-            self.logger.info(f"Switch datapath id {datapath.id} configured successfully")
+            self._install_table_miss(datapath, meter_id)
             
-            self.update_topology() # Trigger topology update
+            # Actions are immutable once built, so the flood action is shared by all packet-ins
+            self.flood_actions[datapath.id] = [parser.OFPActionOutput(ofproto.OFPP_FLOOD)]
+            
+            self.logger.info("Switch datapath id %s configured successfully", datapath.id)
+            
+            self._mark_topology_dirty() # Trigger (coalesced) topology update
         except Exception as e:
-            self.logger.error(f"Error in switch_features_handler: {e}")
+            self.logger.error("Error configuring switch datapath id %s: %s", datapath.id, e)
             self.logger.exception(e)
     
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None): # Add a flow entry to the switch
+    def _install_table_miss(self, datapath, meter_id=None): # Send unmatched packets to the controller
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        
+        match = parser.OFPMatch()
+        actions = [parser.OFPActionOutput(
+            ofproto.OFPP_CONTROLLER,
+            ofproto.OFPCML_NO_BUFFER
+        )]
+        self.add_flow(datapath, 0, match, actions, meter_id=meter_id)
+    
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def error_msg_handler(self, ev): # Fall back to an unmetered table-miss flow if the meter is rejected
         try:
-            ofproto = datapath.ofproto
-            parser = datapath.ofproto_parser
-            
-            inst = [parser.OFPInstructionActions(
-                ofproto.OFPIT_APPLY_ACTIONS, actions
-            )]
-            
-            if buffer_id:
-                mod = parser.OFPFlowMod(
-                    datapath=datapath, buffer_id=buffer_id,
-                    priority=priority, match=match, instructions=inst
-                )
-            else:
-                mod = parser.OFPFlowMod(
-                    datapath=datapath, priority=priority,
-                    match=match, instructions=inst
-                )
-            
-            datapath.send_msg(mod)
+            msg = ev.msg
+            datapath = msg.datapath
+            if msg.type == datapath.ofproto.OFPET_METER_MOD_FAILED:
+                self.logger.warning("Switch datapath id %s rejected the packet-in meter (code %s), installing table-miss flow without it", datapath.id, msg.code)
+                self._install_table_miss(datapath)
+        except Exception as e:
+            self.logger.error("Error in error_msg_handler: %s", e)
+    
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, idle_timeout=0, hard_timeout=0, flags=0, meter_id=None): # Add a flow entry to the switch
+        try:
+            datapath.send_msg(self._flow_mod(datapath, priority, match, actions, buffer_id, idle_timeout, hard_timeout, flags, meter_id))
         except Exception as e:
-            self.logger.error(f"Error adding flow: {e}")
+            self.logger.error("Error adding flow: %s", e)
+    
+    def _flow_mod(self, datapath, priority, match, actions, buffer_id=None, idle_timeout=0, hard_timeout=0, flags=0, meter_id=None): # Build a flow entry message
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        
+        inst = [parser.OFPInstructionActions(
+            ofproto.OFPIT_APPLY_ACTIONS, actions
+        )]
+        if meter_id is not None: # Meter instruction goes before the actions
+            inst.insert(0, parser.OFPInstructionMeter(meter_id))
+        
+        if buffer_id:
+            return parser.OFPFlowMod(
+                datapath=datapath, buffer_id=buffer_id,
+                priority=priority, match=match, instructions=inst,
+                idle_timeout=idle_timeout, hard_timeout=hard_timeout, flags=flags
+            )
+        return parser.OFPFlowMod(
+            datapath=datapath, priority=priority,
+            match=match, instructions=inst,
+            idle_timeout=idle_timeout, hard_timeout=hard_timeout, flags=flags
+        )
+    
+    def _send_batch(self, datapath, msgs): # Serialize messages back to back and write them once
+        bufs = []
+        for msg in msgs:
+            if msg.xid is None:
+                datapath.set_xid(msg)
+            msg.serialize()
+            bufs.append(msg.buf)
+        datapath.send(b''.join(bufs)) # One send-queue entry -> one sendall() on the OF socket
     
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
-    def packet_in_handler(self, ev): # Handle packet-in messages
+    def packet_in_handler(self, ev): # Queue packet-in messages for the workers
+        msg = ev.msg
+        if msg.data[12:14] == ETH_TYPE_LLDP:
+            # Don't process LLDP packets (checked before any parsing)
+            return
+        
+        queue = self._pkt_queues[msg.datapath.id % PACKET_IN_WORKERS]
+        if queue.full(): # Shed load instead of blocking the dispatcher
+            self._pkt_drops += 1
+            self._log_pkt_drops()
+            return
+        queue.put_nowait(ev)
+    
+    def _log_pkt_drops(self): # Warn about dropped packet-ins, at most once per interval
+        now = monotonic()
+        if self._pkt_drop_log_time is not None and now - self._pkt_drop_log_time < PACKET_IN_DROP_LOG_INTERVAL:
+            return
+        self.logger.warning("Packet-in queue full: dropped %s packet-ins (%s total)", self._pkt_drops - self._pkt_drops_logged, self._pkt_drops)
+        self._pkt_drops_logged = self._pkt_drops
+        self._pkt_drop_log_time = now
+    
+    def _pkt_worker(self, queue): # Drain one shard of packet-ins
+        while True:
+            self._handle_packet_in(queue.get())
+    
+    def _handle_packet_in(self, ev): # Handle packet-in messages
         try:
             msg = ev.msg
+            data = msg.data
+            
+            # Hot path: resolve attributes once into locals
             datapath = msg.datapath
             ofproto = datapath.ofproto
             parser = datapath.ofproto_parser
+            FLOOD = ofproto.OFPP_FLOOD
+            NO_BUFFER = ofproto.OFP_NO_BUFFER
+            port_map = self.mac2port
+            buffer_id = msg.buffer_id
             in_port = msg.match['in_port']
             
-            pkt = packet.Packet(msg.data)
-            eth = pkt.get_protocols(ethernet.ethernet)[0]
-            
-            if eth.ethertype == ether_types.ETH_TYPE_LLDP:
-                # Don't process LLDP packets
-                return
-            
-            dst = eth.dst
-            src = eth.src
+            # L2 learning works on the raw Ethernet header, no packet parsing
+            dst = data[0:6]
+            src = data[6:12]
             dpid = datapath.id
             
-            self.mac_to_port.setdefault(dpid, {})
-            
-            self.mac_to_port[dpid][src] = in_port # Learn MAC address
+            port_map[(dpid, src)] = in_port # Learn MAC address
             
-            if dst in self.mac_to_port[dpid]:
-                out_port = self.mac_to_port[dpid][dst]
+            if data[0] & 1: # Group (broadcast/multicast) destinations are never learned
+                out_port = FLOOD
             else:
-                out_port = ofproto.OFPP_FLOOD
+                out_port = port_map.get((dpid, dst), FLOOD)
             
-            actions = [parser.OFPActionOutput(out_port)]
-
             # Always flood ARP (helps dynamic host addition)
-            arp_pkt = pkt.get_protocol(arp.arp)
-            if arp_pkt is not None:
-                out_port = ofproto.OFPP_FLOOD
+            if data[12:14] == ETH_TYPE_ARP:
+                out_port = FLOOD
+            
+            if out_port == FLOOD:
+                actions = self.flood_actions.get(dpid) or [parser.OFPActionOutput(FLOOD)]
+            else:
                 actions = [parser.OFPActionOutput(out_port)]
             
             # L2 learning-switch flow for known unicast destinations
-            if out_port != ofproto.OFPP_FLOOD:
-                match = parser.OFPMatch(eth_dst=dst)
-                if msg.buffer_id != ofproto.OFP_NO_BUFFER:
-                    self.add_flow(datapath, 1, match, actions, msg.buffer_id)
-                    return
-                else:
-                    self.add_flow(datapath, 1, match, actions)
+            msgs = []
+            new_flows = []
+            if out_port != FLOOD:
+                # Learned flows expire when idle and report back, so stale MACs get relearned
+                flags = ofproto.OFPFF_SEND_FLOW_REM
+                
+                # Reverse direction first: src was just learned on in_port, so the
+                # reply traffic does not need another packet-in
+                if not self._flow_installed((dpid, src), in_port):
+                    match_rev = parser.OFPMatch(eth_dst=addrconv.mac.bin_to_text(src))
+                    msgs.append(self._flow_mod(datapath, 1, match_rev, [parser.OFPActionOutput(in_port)],
+                                               idle_timeout=FLOW_IDLE_TIMEOUT, flags=flags))
+                    new_flows.append(((dpid, src), in_port))
+                
+                # Packets already in flight before the switch applied the flow only need a PacketOut
+                if not self._flow_installed((dpid, dst), out_port):
+                    match = parser.OFPMatch(eth_dst=addrconv.mac.bin_to_text(dst))
+                    new_flows.append(((dpid, dst), out_port))
+                    if buffer_id != NO_BUFFER:
+                        # The buffered packet is released by the switch through the new flow
+                        msgs.append(self._flow_mod(datapath, 1, match, actions, buffer_id,
+                                                   idle_timeout=FLOW_IDLE_TIMEOUT, flags=flags))
+                        self._send_batch(datapath, msgs)
+                        self._remember_flows(new_flows)
+                        return
+                    else:
+                        msgs.append(self._flow_mod(datapath, 1, match, actions,
+                                                   idle_timeout=FLOW_IDLE_TIMEOUT, flags=flags))
             
-            data = None
-            if msg.buffer_id == ofproto.OFP_NO_BUFFER:
-                data = msg.data
-            
-            out = parser.OFPPacketOut(
-                datapath=datapath, buffer_id=msg.buffer_id,
-                in_port=in_port, actions=actions, data=data
-            )
-            datapath.send_msg(out)
+            msgs.append(parser.OFPPacketOut(
+                datapath=datapath, buffer_id=buffer_id, in_port=in_port,
+                actions=actions, data=data if buffer_id == NO_BUFFER else None
+            ))
+            self._send_batch(datapath, msgs)
+            self._remember_flows(new_flows)
+        except Exception as e:
+            self.logger.error("Error in packet_in_handler: %s", e)
+    
+    def _flow_installed(self, key, out_port): # Was this exact flow sent to the switch recently?
+        entry = self._installed.get(key)
+        # Packet-ins still arriving long after the send mean the switch rejected or lost the flow
+        if entry is not None and entry[0] == out_port and monotonic() - entry[1] < FLOW_IDLE_TIMEOUT:
+            self._installed.move_to_end(key)
+            return True
+        return False
+    
+    def _remember_flows(self, flows):
+        installed = self._installed
+        now = monotonic()
+        for key, out_port in flows:
+            installed[key] = (out_port, now)
+            installed.move_to_end(key)
+        while len(installed) > INSTALLED_FLOWS_MAX:
+            installed.popitem(last=False)
+    
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev): # Forget the MAC of an expired learned flow
+        try:
+            msg = ev.msg
+            dst = msg.match.get('eth_dst')
+            if dst is not None:
+                key = (msg.datapath.id, addrconv.mac.text_to_bin(dst))
+                self.mac2port.pop(key, None)
+                self._installed.pop(key, None)
         except Exception as e:
-            self.logger.error(f"Error in packet_in_handler: {e}")
+            self.logger.error("Error in flow_removed_handler: %s", e)
     
     @set_ev_cls(event.EventSwitchEnter)
     def switch_enter_handler(self, ev): # Handle switch addition
         try:
             switch = ev.switch
-            self.logger.info(f"Topology: Switch {switch.dp.id} ENTERED")
-            self.update_topology()
+            self.logger.info("Topology: Switch %s ENTERED", switch.dp.id)
+            self._add_switch(switch)
         except Exception as e:
-            self.logger.error(f"Error in switch_enter_handler: {e}")
+            self.logger.error("Error in switch_enter_handler: %s", e)
     
     @set_ev_cls(event.EventSwitchLeave)
     def switch_leave_handler(self, ev): # Handle switch removal
         try:
             switch = ev.switch
-            self.logger.warning(f"Topology: Switch {switch.dp.id} LEFT")
-            self.update_topology()
+            self.logger.warning("Topology: Switch %s LEFT", switch.dp.id)
+            self._remove_switch(switch.dp.id)
         except Exception as e:
-            self.logger.error(f"Error in switch_leave_handler: {e}")
+            self.logger.error("Error in switch_leave_handler: %s", e)
     
     @set_ev_cls(event.EventLinkAdd)
     def link_add_handler(self, ev): # Handle link addition
         try:
             link = ev.link
-            self.logger.info(f"Topology: Link ADDED s{link.src.dpid}:{link.src.port_no} -> s{link.dst.dpid}:{link.dst.port_no}")
-            self.update_topology()
+            self.logger.info("Topology: Link ADDED s%s:%s -> s%s:%s", link.src.dpid, link.src.port_no, link.dst.dpid, link.dst.port_no)
+            self._add_link(link)
         except Exception as e:
-            self.logger.error(f"Error in link_add_handler: {e}")
+            self.logger.error("Error in link_add_handler: %s", e)
     
     @set_ev_cls(event.EventLinkDelete)
     def link_delete_handler(self, ev): # Handle link deletion
         try:
             link = ev.link
-            self.logger.warning(f"Topology: Link DELETED s{link.src.dpid}:{link.src.port_no} -> s{link.dst.dpid}:{link.dst.port_no}")
-            self.update_topology()
+            self.logger.warning("Topology: Link DELETED s%s:%s -> s%s:%s", link.src.dpid, link.src.port_no, link.dst.dpid, link.dst.port_no)
+            self._remove_link(link)
         except Exception as e:
-            self.logger.error(f"Error in link_delete_handler: {e}")
+            self.logger.error("Error in link_delete_handler: %s", e)
     
     @set_ev_cls(event.EventHostAdd)
     def host_add_handler(self, ev): # Handle host addition
         try:
             host = ev.host
-            self.logger.info(f"Topology: Host ADDED {host.mac} at s{host.port.dpid}:{host.port.port_no}")
-            self.update_topology()
+            self.logger.info("Topology: Host ADDED %s at s%s:%s", host.mac, host.port.dpid, host.port.port_no)
+            self._add_host(host)
         except Exception as e:
-            self.logger.error(f"Error in host_add_handler: {e}")
+            self.logger.error("Error in host_add_handler: %s", e)
     
-    def update_topology(self): # Update topology information
+    @set_ev_cls(event.EventHostMove)
+    def host_move_handler(self, ev): # Handle host moving to another port
+        try:
+            host = ev.dst
+            self.logger.info("Topology: Host MOVED %s to s%s:%s", host.mac, host.port.dpid, host.port.port_no)
+            self._add_host(host)
+        except Exception as e:
+            self.logger.error("Error in host_move_handler: %s", e)
+    
+    def _add_switch(self, switch): # Insert (or refresh) a single switch
+        self._put('switches', str(switch.dp.id), _switch_entry(switch.dp.id, (port.port_no for port in switch.ports)))
+        self._topology_changed()
+    
+    def _remove_switch(self, dpid): # Drop a switch together with its links and hosts
+        self._drop('switches', str(dpid))
+        for key in [key for key in self.topology['links'] if key[0] == dpid or key[2] == dpid]:
+            self._drop('links', key)
+        for mac in [mac for mac, host in self.topology['hosts'].items() if host['dpid'] == dpid]:
+            self._drop('hosts', mac)
+        self._topology_changed()
+    
+    def _add_link(self, link):
+        self._put('links', _link_key(link), _link_entry(link))
+        self._topology_changed()
+    
+    def _remove_link(self, link):
+        self._drop('links', _link_key(link))
+        self._topology_changed()
+    
+    def _add_host(self, host):
+        self._put_host(host, _host_entry(host))
+        self._topology_changed()
+    
+    def _host_refresh_loop(self):
+        while True:
+            hub.sleep(HOST_REFRESH_INTERVAL)
+            try:
+                self.refresh_hosts()
+            except Exception as e:
+                self.logger.error("Error refreshing hosts: %s", e)
+    
+    def refresh_hosts(self): # Sync hosts the topology app updated or deleted without an event
+        sw_app = app_manager.lookup_service_brick('switches')
+        if sw_app is None:
+            return
+        
+        live = sw_app.hosts # MAC -> Host, e.g. IPs are learned and LLDP-detected link ports are purged silently
+        hosts = self.topology['hosts']
+        changed = False
+        for mac in [mac for mac in hosts if mac not in live]:
+            self._drop('hosts', mac)
+            changed = True
+        for host in list(live.values()):
+            entry = _host_entry(host)
+            if hosts.get(host.mac) != entry:
+                self._put_host(host, entry)
+                changed = True
+        
+        if changed:
+            self._topology_changed()
+    
+    def _put_host(self, host, entry):
+        self._put('hosts', host.mac, entry)
+        
+        # The host port may have been attached after the switch entered
+        switch_key = str(host.port.dpid)
+        switch = self.topology['switches'].get(switch_key)
+        if switch is not None and host.port.port_no not in switch['ports']:
+            switch['ports'].append(host.port.port_no)
+            self._put('switches', switch_key, switch)
+    
+    def _put(self, section, key, entry): # Store an entry along with its encoded JSON
+        self.topology[section][key] = entry
+        self._fragments[section][key] = _encode_member(section, key, entry)
+    
+    def _drop(self, section, key):
+        self.topology[section].pop(key, None)
+        self._fragments[section].pop(key, None)
+    
+    def encode_section(self, section): # JSON of a topology section, joined from pre-encoded entries
+        opening, closing = _SECTION_BRACKETS[section]
+        return opening + b','.join(self._fragments[section].values()) + closing
+    
+    def encode_topology(self):
+        return b'{"switches":%s,"links":%s,"hosts":%s,"version":%d}' % (
+            self.encode_section('switches'),
+            self.encode_section('links'),
+            self.encode_section('hosts'),
+            self.topology['version']
+        )
+    
+    def _topology_changed(self): # Publish an in-place mutation under a new version
+        self.topology['version'] += 1
+        self.logger.info("Topology updated to version %s - Switches: %s, Links: %s, Hosts: %s", self.topology['version'], len(self.topology['switches']), len(self.topology['links']), len(self.topology['hosts']))
+    
+    def _mark_topology_dirty(self): # Request a resync, bursts collapse into a single one
+        self._topo_dirty = True
+        if not self._topo_flush_scheduled:
+            self._topo_flush_scheduled = True
+            hub.spawn_after(TOPOLOGY_FLUSH_DELAY, self._flush_topology)
+    
+    def _flush_topology(self):
+        self._topo_flush_scheduled = False
+        if self._topo_dirty:
+            self._topo_dirty = False
+            self.update_topology()
+    
+    def update_topology(self): # Full resync of topology information from the topology app
         try:
-            switch_list = get_switch(self, None)
             switches = {}
-            for switch in switch_list:
-                dpid = switch.dp.id
-                switches[str(dpid)] = {
-                    'dpid': dpid,
-                    'ports': [port.port_no for port in switch.ports if port.port_no < 65535]
-                }
+            links = {} # Keyed by (src_dpid, src_port, dst_dpid, dst_port) for O(1) deletion
+            hosts = {}
             
-            links_list = get_link(self, None) # Get all links
-            links = []
-            for link in links_list:
-                links.append({
-                    'src_dpid': link.src.dpid,
-                    'src_port': link.src.port_no,
-                    'dst_dpid': link.dst.dpid,
-                    'dst_port': link.dst.port_no
-                })
+            sw_app = app_manager.lookup_service_brick('switches')
+            if sw_app is not None: # Read the topology app state directly, no request/reply events
+                for dpid in sw_app.dps:
+                    switches[str(dpid)] = _switch_entry(dpid, sw_app.port_state.get(dpid, {}))
+                link_list = sw_app.links
+                host_list = sw_app.hosts.values()
+            else: # Topology app not registered yet, go through the API
+                for switch in get_switch(self, None):
+                    switches[str(switch.dp.id)] = _switch_entry(switch.dp.id, (port.port_no for port in switch.ports))
+                link_list = get_link(self, None)
+                host_list = get_host(self, None)
             
-            hosts_list = get_host(self, None) # Get all hosts
-            hosts = {}
-            for host in hosts_list:
-                hosts[host.mac] = {
-                    'mac': host.mac,
-                    'ipv4': host.ipv4[0] if host.ipv4 else None,
-                    'ipv6': host.ipv6[0] if host.ipv6 else None,
-                    'port': host.port.port_no,
-                    'dpid': host.port.dpid
-                }
+            for link in link_list:
+                links[_link_key(link)] = _link_entry(link)
             
-            old_version = self.topology['version'] # Update topology
-            self.topology = {
-                'switches': switches,
-                'links': links,
-                'hosts': hosts,
-                'version': old_version + 1
-            }
+            for host in host_list:
+                hosts[host.mac] = _host_entry(host)
             
-            self.logger.info(f"Topology updated to version {self.topology['version']} - Switches: {len(switches)}, Links: {len(links)}, Hosts: {len(hosts)}")
+            # Mutate the long-lived containers in place, the version bump goes last
+            for section, entries in (('switches', switches), ('links', links), ('hosts', hosts)):
+                self.topology[section].clear()
+                self.topology[section].update(entries)
+                fragments = self._fragments[section]
+                fragments.clear()
+                fragments.update((key, _encode_member(section, key, entry)) for key, entry in entries.items())
+            self.topology['version'] += 1
+            
+            self.logger.info("Topology updated to version %s - Switches: %s, Links: %s, Hosts: %s", self.topology['version'], len(switches), len(links), len(hosts))
         except Exception as e:
-            self.logger.error(f"Error updating topology: {e}")
+            self.logger.error("Error updating topology: %s", e)
             self.logger.exception(e)
+
+
+def _json_dumps(obj): # Compact JSON as bytes
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+_SECTION_BRACKETS = {'switches': (b'{', b'}'), 'links': (b'[', b']'), 'hosts': (b'{', b'}')}
+
+
+def _encode_member(section, key, entry): # JSON of one entry as it appears inside its section
+    if section == 'links': # Served as a list
+        return _json_dumps(entry)
+    return _json_dumps(key) + b':' + _json_dumps(entry)
+
+
+def _switch_entry(dpid, port_nos):
+    return {
+        'dpid': dpid,
+        'ports': [port_no for port_no in port_nos if port_no < 65535]
+    }
+
+
+def _link_key(link):
+    return (link.src.dpid, link.src.port_no, link.dst.dpid, link.dst.port_no)
+
+
+def _link_entry(link):
+    return {
+        'src_dpid': link.src.dpid,
+        'src_port': link.src.port_no,
+        'dst_dpid': link.dst.dpid,
+        'dst_port': link.dst.port_no
+    }
+
+
+def _host_entry(host):
+    return {
+        'mac': host.mac,
+        'ipv4': host.ipv4[0] if host.ipv4 else None,
+        'ipv6': host.ipv6[0] if host.ipv6 else None,
+        'port': host.port.port_no,
+        'dpid': host.port.dpid
+    }
             
 
 class NetworkAPI(ControllerBase): # REST API for topology exposure
@@ -253,45 +569,51 @@ class NetworkAPI(ControllerBase): # REST API for topology exposure
         super(NetworkAPI, self).__init__(req, link, data, **config)
         self.controller = data[api_instance_name]
     
-    @route('topology', '/api/topology', methods=['GET'])
-    def get_topology(self, req, **kwargs):
-        body = json.dumps(self.controller.topology, indent=2)
+    def _json_response(self, req, route_name, encode): # Serialize once per topology version
+        topology = self.controller.topology
+        version = topology['version']
+        
+        etag = str(version)
+        if etag in req.if_none_match: # Client already holds this version
+            return Response(status=304, etag=etag)
+        
+        cache = self.controller.api_cache
+        body = cache.get((route_name, version))
+        if body is None:
+            body = encode()
+            # Keep only entries of the current version (older ones can never be hit again)
+            cache = {key: value for key, value in cache.items() if key[1] == version}
+            cache[(route_name, version)] = body
+            self.controller.api_cache = cache
+        
         return Response(
             content_type='application/json',
-            body=body.encode('utf-8')
+            body=body,
+            etag=etag
         )
     
+    @route('topology', '/api/topology', methods=['GET'])
+    def get_topology(self, req, **kwargs):
+        return self._json_response(req, 'topology', self.controller.encode_topology)
+    
     @route('switches', '/api/switches', methods=['GET'])
     def get_switches(self, req, **kwargs):
-        body = json.dumps(self.controller.topology['switches'], indent=2)
-        return Response(
-            content_type='application/json',
-            body=body.encode('utf-8')
-        )
+        return self._json_response(req, 'switches', lambda: self.controller.encode_section('switches'))
     
     @route('links', '/api/links', methods=['GET'])
     def get_links(self, req, **kwargs):
-        body = json.dumps(self.controller.topology['links'], indent=2)
-        return Response(
-            content_type='application/json',
-            body=body.encode('utf-8')
-        )
+        return self._json_response(req, 'links', lambda: self.controller.encode_section('links'))
     
     @route('hosts', '/api/hosts', methods=['GET'])
     def get_hosts(self, req, **kwargs):
-        body = json.dumps(self.controller.topology['hosts'], indent=2)
-        return Response(
-            content_type='application/json',
-            body=body.encode('utf-8')
-        )
+        return self._json_response(req, 'hosts', lambda: self.controller.encode_section('hosts'))
 
     @route('version', '/api/version', methods=['GET'])
     def get_version(self, req, **kwargs):
         version_info = {
             'version': self.controller.topology['version']
         }
-        body = json.dumps(version_info, indent=2)
         return Response(
             content_type='application/json',
-            body=body.encode('utf-8')
+            body=_json_dumps(version_info)
         )
\ No newline at end of file
@@ -1,68 +1,156 @@
-import urllib.request
-import urllib.error
-import json
+import requests
+from requests.adapters import HTTPAdapter
 import argparse
+import hashlib
+import random
+import socket
 from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.node import RemoteController, Host
 from mininet.cli import CLI
-from mininet.log import setLogLevel, info, error, output
+from mininet.log import setLogLevel, info, error, output, lg, LEVELS
 from mininet.link import TCLink
-from time import sleep
+from time import sleep, monotonic
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
 import threading
 import sys
+import os
+
+try:
+    from orjson import loads as _json_loads
+except ImportError: # Optional, the stdlib parser is used as fallback
+    from json import loads as _json_loads
+
+try:
+    from pyroute2 import IPRoute, NetlinkError
+except ImportError: # Optional, interfaces are toggled with ifconfig otherwise
+    IPRoute = NetlinkError = None
 
 RYU_URL = 'http://localhost:8080'
 TOPOLOGY_ENDPOINT = '/api/topology'
 CONTROLLER_IP = '127.0.0.1'
 CONTROLLER_PORT = 6634
 SYNC_INTERVAL = 10
-MAX_RETRIES = 4
-RETRY_DELAY = 7
+MAX_RETRIES = 8
+RETRY_BASE_DELAY = 0.5 # Seconds, doubled on every attempt
+RETRY_MAX_DELAY = 4
+HOST_CONFIG_WORKERS = 16 # Set to 1 to configure hosts with Mininet's own serial configHosts()
+
+# Sentinels returned by _fetch_json instead of a topology
+UNCHANGED = object() # Nothing changed since the last fetch
+NOT_FOUND = object() # Client error (e.g. 404) or unresolvable host: retrying will not help
+
+def _is_resolution_error(exc): # Walk the wrapped exceptions looking for a DNS failure
+    pending = [exc]
+    seen = set()
+    while pending:
+        e = pending.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, socket.gaierror):
+            return True
+        # requests -> urllib3 MaxRetryError.reason -> NewConnectionError -> gaierror
+        pending.extend((e.__cause__, e.__context__, getattr(e, 'reason', None)))
+        pending.extend(arg for arg in e.args if isinstance(arg, BaseException))
+    return False
+
+def _ordered_pair(a, b): # Order-independent key for a bidirectional link, one comparison instead of sorted()
+    return (a, b) if a <= b else (b, a)
+
+def _backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY): # Exponential backoff with jitter
+    return min(cap, base * 2 ** attempt) * (0.5 + random.random())
 
-def _fetch_json(endpoint, base_url=RYU_URL, timeout=10): # Helper method to fetch JSON from endpoint
+# Shared HTTP session: the sync loop reuses a keep-alive connection instead of reconnecting every poll
+_SESSION = requests.Session()
+_SESSION.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+
+def _fetch_json(endpoint, base_url=RYU_URL, timeout=10, cache=None): # Helper method to fetch JSON from endpoint
+    # cache: optional dict remembering the last ETag and body digest, enables UNCHANGED replies.
+    # A new ETag/digest is only staged under 'pending', see TopologyFetcher.commit()
     try:
-        url = base_url + endpoint
-        with urllib.request.urlopen(url, timeout=timeout) as response:
-            data = response.read().decode('utf-8')
-            return json.loads(data)
-    except urllib.error.URLError as e:
+        headers = {}
+        if cache and cache.get('etag'):
+            headers['If-None-Match'] = cache['etag']
+        
+        response = _SESSION.get(base_url + endpoint, timeout=timeout, headers=headers)
+        if response.status_code == 304:
+            return UNCHANGED
+        if 400 <= response.status_code < 500:
+            return NOT_FOUND
+        response.raise_for_status() # 5xx: back off and retry
+        body = response.content # Raw bytes, never decoded to a str
+        
+        if cache is not None: # Same bytes as last time, skip decoding
+            digest = hashlib.blake2b(body, digest_size=8).digest()
+            if digest == cache.get('digest'):
+                return UNCHANGED
+            cache['pending'] = (response.headers.get('ETag'), digest)
+        
+        return _json_loads(body) # Parse the raw bytes, no intermediate str
+    except requests.Timeout as e:
+        return None
+    except requests.ConnectionError as e:
+        if _is_resolution_error(e):
+            return NOT_FOUND
+        return None # Connection refused: controller may still be starting, back off and retry
+    except requests.RequestException as e:
         return None
-    except json.JSONDecodeError as e:
+    except ValueError as e: # Invalid JSON
         return None
 
 
 class TopologyFetcher: # Handles robust topology fetching with retries and validation
     def __init__(self, api_url=RYU_URL):
         self.api_url = api_url
+        self._cache = {} # ETag / body digest of the last applied topology
+    
+    def commit(self): # The last fetched topology was applied, later polls may report it UNCHANGED
+        pending = self._cache.pop('pending', None)
+        if pending is not None:
+            self._cache['etag'], self._cache['digest'] = pending
     
-    def fetch_topology(self, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, silent=False):  # Fetch topology with retry logic and validation
+    def fetch_topology(self, max_retries=MAX_RETRIES, silent=False):  # Fetch topology with retry logic and validation
+        # Returns UNCHANGED if the topology is the same as the previous valid fetch
         if not silent:
             info(f"Fetching topology from {self.api_url}\n")
         
         for attempt in range(max_retries):
+            delay = _backoff_delay(attempt)
             try:
-                topology = _fetch_json(TOPOLOGY_ENDPOINT, self.api_url, timeout=5)
+                topology = _fetch_json(TOPOLOGY_ENDPOINT, self.api_url, timeout=5, cache=self._cache)
+                
+                if topology is UNCHANGED:
+                    return UNCHANGED
+                
+                if topology is NOT_FOUND:
+                    if not silent:
+                        error(f'Topology endpoint not found at {self.api_url}{TOPOLOGY_ENDPOINT}\n')
+                    return None
                 
                 if not topology:
                     if not silent:
                         error(f'Failed to fetch topology (attempt {attempt + 1}/{max_retries})\n')
                     if attempt < max_retries - 1:
-                        sleep(retry_delay)
+                        sleep(delay)
                     continue
                 
+                if not topology.get('switches', {}) or not topology.get('links', []):
+                    self._cache.clear() # Only remember topologies that passed validation
+                
                 if not topology.get('switches', {}): # Validate topology has switches
                     if not silent:
                         error(f'No switches in topology yet (attempt {attempt + 1}/{max_retries})\n')
                     if attempt < max_retries - 1:
-                        sleep(retry_delay)
+                        sleep(delay)
                     continue
                 
                 if not topology.get('links', []): # Check for links
                     if not silent:
                         error(f'WARNING: No links discovered yet\n')
                     if attempt < max_retries - 1:
-                        sleep(retry_delay)
+                        sleep(delay)
                     continue
                 
                 if not silent: # Success
@@ -78,7 +166,7 @@ class TopologyFetcher: # Handles robust topology fetching with retries and valid
                 if not silent:
                     error(f'Connection attempt {attempt + 1}/{max_retries} failed: {e}\n')
                 if attempt < max_retries - 1:
-                    sleep(retry_delay)
+                    sleep(delay)
         
         if not silent:
             error('Failed to fetch topology after maximum retries\n')
@@ -89,25 +177,28 @@ class DigitalTwinTopo(Topo): # Mininet topology with port conflict detection
     def __init__(self, topology_data):
         self.topology_data = topology_data
         self.switch_map = {}  # Map dpid to Mininet switch name
+        self.switch_dpids = {}  # Map Mininet switch name to integer dpid
         self.host_map = {}    # Map MAC to Mininet host name
-        self.switch_link_ports = {}  # Ports used for switch-to-switch links
+        self.switch_link_ports = defaultdict(set)  # Ports used for switch-to-switch links (frozen after _process_links)
         Topo.__init__(self)
     
     def build(self):
         info("Building digital twin topology\n")
         
-        self._create_switches()
+        # Extract each collection once and hand it to the step that needs it
+        switches = self.topology_data.get('switches', {})
+        links = self.topology_data.get('links', [])
+        hosts = self.topology_data.get('hosts', {})
+        
+        self._create_switches(switches)
         
-        self._analyze_switch_links()
-        self._create_switch_links()
+        self._process_links(links)
         
-        self._create_hosts()
+        self._create_hosts(hosts)
         
         info("Topology build complete\n")
     
-    def _create_switches(self):
-        switches = self.topology_data.get('switches', {})
-        
+    def _create_switches(self, switches):
         for dpid_str, switch_info in switches.items():
             dpid = switch_info.get('dpid')
             
@@ -121,33 +212,24 @@ class DigitalTwinTopo(Topo): # Mininet topology with port conflict detection
                 switch_name = f"twin_s{dpid_int}"
                 
                 self.switch_map[dpid_int] = switch_name
+                self.switch_dpids[switch_name] = dpid_int
                 self.addSwitch(switch_name, dpid=dpid_hex)
                 info(f"    Added switch {switch_name} (dpid: {dpid_hex})\n")
     
-    def _analyze_switch_links(self): # Analyze which ports are used for switch-to-switch links
-        links = self.topology_data.get('links', [])
+    def _process_links(self, links): # Track switch-link ports and create links avoiding duplicates, in one pass
+        # Create unique link identifiers (bidirectional) up front, so the table is sized once
+        link_ids = [_ordered_pair(link.get('src_dpid'), link.get('dst_dpid')) for link in links]
+        pending_links = dict.fromkeys(link_ids, True)  # link_id -> not created yet
         
-        for link in links:
+        for link, link_id in zip(links, link_ids):
             src_dpid = link.get('src_dpid')
             dst_dpid = link.get('dst_dpid')
-            src_port = link.get('src_port')
-            dst_port = link.get('dst_port')
             
             # Track which ports are used for inter-switch links
-            self.switch_link_ports.setdefault(src_dpid, set()).add(src_port)
-            self.switch_link_ports.setdefault(dst_dpid, set()).add(dst_port)
-    
-    def _create_switch_links(self): # Create links between switches avoiding duplicates
-        links = self.topology_data.get('links', [])
-        added_links = set()
-        
-        for link in links:
-            src_dpid = link.get('src_dpid')
-            dst_dpid = link.get('dst_dpid')
-            
-            link_id = tuple(sorted([src_dpid, dst_dpid])) # Create unique link identifier (bidirectional)
+            self.switch_link_ports[src_dpid].add(link.get('src_port'))
+            self.switch_link_ports[dst_dpid].add(link.get('dst_port'))
             
-            if link_id in added_links:
+            if not pending_links[link_id]:
                 continue
             
             if src_dpid in self.switch_map and dst_dpid in self.switch_map:
@@ -162,10 +244,12 @@ class DigitalTwinTopo(Topo): # Mininet topology with port conflict detection
                 )
                 info(f"Linked {src_switch} <-> {dst_switch}\n")
                 
-                added_links.add(link_id)
+                pending_links[link_id] = False
+        
+        # Read-only from here on
+        self.switch_link_ports = {dpid: frozenset(ports) for dpid, ports in self.switch_link_ports.items()}
     
-    def _create_hosts(self): # Create hosts from topology data with port conflict detection
-        hosts = self.topology_data.get('hosts', {})
+    def _create_hosts(self, hosts): # Create hosts from topology data with port conflict detection
         host_counter = 1
         hosts_added = 0
         
@@ -233,6 +317,27 @@ class DigitalTwinTopo(Topo): # Mininet topology with port conflict detection
                     break
 
 
+class TwinMininet(Mininet): # Mininet that configures hosts concurrently
+    def configHosts(self):
+        # Mirrors Mininet.configHosts() of Mininet 2.3.0, keep in step when upgrading
+        if HOST_CONFIG_WORKERS <= 1: # Serial path, upstream behaviour
+            return super().configHosts()
+        
+        # Each host has its own shell, so their ifconfig/route commands can overlap
+        def configure(host):
+            if host.defaultIntf():
+                host.configDefault()
+            else: # Don't configure nonexistent intf
+                host.configDefault(ip=None, mac=None)
+            return host
+        
+        with ThreadPoolExecutor(max_workers=HOST_CONFIG_WORKERS) as pool:
+            futures = [pool.submit(configure, host) for host in self.hosts]
+            for future in as_completed(futures):
+                info(future.result().name + ' ')
+        info('\n')
+
+
 class DigitalTwin: # Digital twin network with dynamic synchronization
     def __init__(self, topology_data, enable_sync=False):
         self.topology_data = topology_data
@@ -241,16 +346,23 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
         self.topo = None
         self.sync_thread = None
         self.running = False
+        self._wake = threading.Event()  # Set by stop_sync to interrupt the wait between polls
         self.link_map = {}  # Map (dpid1, dpid2) -> Link object
         self.host_counter = len(topology_data.get('hosts', {})) + 1
         self.created_hosts = {}  # Track dynamically created hosts: MAC -> Host object
+        self._switch_by_name = {}  # Map switch name -> Switch object
+        self._host_index = {}  # Map MAC -> (Host object, IP) of every twin host
+        self._prompt_needed = False  # Sync output was printed over the CLI prompt
+        self._ipr = None  # Netlink socket for link state changes (pyroute2)
+        self._ifindex = {}  # Map switch interface name -> ifindex
+        self._link_keys = frozenset(self._link_key(l) for l in topology_data.get('links', []))  # Link keys of topology_data
     
     def create(self): # Create and start the digital twin network
         info("Creating digital twin network\n")
         
         self.topo = DigitalTwinTopo(self.topology_data) # Build topology
 
-        self.net = Mininet(
+        self.net = TwinMininet(
             topo=self.topo,
             link=TCLink,
             autoSetMacs=True,
@@ -267,15 +379,34 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
         self.net.addController(controller)
         
         self.net.build()
+        self._host_index = {h.MAC(): (h, h.IP()) for h in self.net.hosts}
+        
         info("Starting digital twin network\n")
         self.net.start()
         
+        self._switch_by_name = {s.name: s for s in self.net.switches}
+        for name, dpid_int in self.topo.switch_dpids.items(): # Memoize integer dpids on the nodes
+            self._switch_by_name[name]._dpid_int = dpid_int
+        
         info("Starting controller\n")
         self.net.controllers[0].start()
         
         
         self._build_link_map() # Build link map for quick lookup
         
+        if IPRoute is not None: # Switch interfaces live in the root namespace
+            try:
+                self._ipr = IPRoute()
+                for link in self.link_map.values():
+                    for intf in (link.intf1, link.intf2):
+                        self._ifindex[intf.name] = self._ipr.link_lookup(ifname=intf.name)[0]
+            except Exception as e:
+                info(f"WARNING: netlink unavailable ({e}), using ifconfig for link changes\n")
+                if self._ipr is not None:
+                    self._ipr.close()
+                self._ipr = None
+                self._ifindex = {}
+        
         # Wait for switches to connect with timeout
         info("Waiting for switches to connect to controller (max 30 seconds)\n")
         try:
@@ -300,31 +431,31 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
             node2 = link.intf2.node
             
             if hasattr(node1, 'dpid') and hasattr(node2, 'dpid'): # Only map switch-to-switch links
-                # Extract dpid numbers
-                dpid1 = int(node1.dpid, 16)
-                dpid2 = int(node2.dpid, 16)
+                # Extract dpid numbers (memoized at creation, parsed only as fallback)
+                dpid1 = getattr(node1, '_dpid_int', None) or int(node1.dpid, 16)
+                dpid2 = getattr(node2, '_dpid_int', None) or int(node2.dpid, 16)
                 
-                key1 = tuple(sorted([dpid1, dpid2])) # Store in both directions
+                key1 = _ordered_pair(dpid1, dpid2) # Store in both directions
                 self.link_map[key1] = link
                 
                 info(f"    Mapped link: s{dpid1} <-> s{dpid2}\n")
     
     def _wait_for_switches(self, timeout=30): 
-        import time
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            all_connected = True
-            for switch in self.net.switches:
-                if not switch.connected():
-                    all_connected = False
-                    break
+        deadline = monotonic() + timeout
+        pending = list(self.net.switches)
+        attempt = 0
+        
+        while monotonic() < deadline:
+            # Connected switches are never checked again (each check runs ovs-vsctl)
+            while pending and pending[0].connected():
+                pending.pop(0)
             
-            if all_connected:
+            if not pending:
                 return True
             
             info(".")
-            sleep(1)
+            sleep(min(2.0, 0.1 * 2 ** attempt)) # Adaptive backoff: react fast at startup, poll less later
+            attempt += 1
         
         info("\n")
         return False
@@ -363,6 +494,7 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
             return
         
         self.running = True
+        self._wake.clear()
         self.sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
         self.sync_thread.start()
         info(f"Started topology synchronization (interval: {SYNC_INTERVAL}s)\n")
@@ -370,54 +502,68 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
         info("Sync runs in background - you can still use the CLI!\n\n")
     
     def _sync_loop(self): # Background thread to continuously sync topology
-        last_version = self.topology_data.get('version', 0)
+        # Single writer: topology_data is only replaced here, by rebinding the attribute to a
+        # fully built topology (atomic under the GIL), so readers just take a reference
+        fetcher = TopologyFetcher(RYU_URL) # Kept across polls for conditional GETs
         
         while self.running:
-            sleep(SYNC_INTERVAL)
+            if self._wake.wait(SYNC_INTERVAL): # Set by stop_sync
+                break
             
             try:
                 # Fetch latest topology from real network (silently)
-                fetcher = TopologyFetcher(RYU_URL)
                 new_topology = fetcher.fetch_topology(max_retries=1, silent=True)
                 
-                if not new_topology:
+                if new_topology is UNCHANGED or not new_topology:
                     continue
                 
+                current = self.topology_data # Snapshot for this tick
+                last_version = current.get('version', 0)
                 new_version = new_topology.get('version', 0)
                 
                 # Check if topology changed
                 if new_version > last_version:
                     output(f"!!!TOPOLOGY CHANGE DETECTED!!! (v{last_version} -> v{new_version})\n")
-                    self._handle_topology_change(self.topology_data, new_topology)
+                    new_link_keys = frozenset(self._link_key(l) for l in new_topology.get('links', []))
+                    self._handle_topology_change(current, new_topology, new_link_keys)
                     
-                    output("mininet> ")  # Re-print prompt
-                    self.topology_data = new_topology
-                    last_version = new_version
+                    self._link_keys = new_link_keys
+                    self.topology_data = new_topology # Publish once the change is applied
+                
+                fetcher.commit() # Not reached if applying failed, so the change is fetched again
+                
+                if self._prompt_needed: # Re-print prompt once per tick, straight to the fd
+                    self._prompt_needed = False
+                    if lg.isEnabledFor(LEVELS['output']): # Same level as the change report
+                        os.write(sys.stdout.fileno(), b"mininet> ")
             
             except Exception as e:
                 error(f"Sync error: {e}\n")
     
-    def _handle_topology_change(self, old_topology, new_topology): # Handle changes in topology 
-        # 1. Handle LINK changes
-        old_links = {self._link_key(l) for l in old_topology.get('links', [])}
-        new_links = {self._link_key(l) for l in new_topology.get('links', [])}
+    def _handle_topology_change(self, old_topology, new_topology, new_link_keys): # Handle changes in topology 
+        self._prompt_needed = True
+        
+        # 1. Handle LINK changes (old keys are kept from the previous sync, not recomputed)
+        added_links = new_link_keys - self._link_keys
+        removed_links = self._link_keys - new_link_keys
         
-        added_links = new_links - old_links
-        removed_links = old_links - new_links
+        link_changes = []  # (interface, state) pairs applied together below
         
         if removed_links:
             output(f"Links REMOVED: {len(removed_links)}\n")
             for link_key in removed_links:
                 dpid1, dpid2 = link_key[0][0], link_key[1][0]
                 output(f"     - s{dpid1} <-> s{dpid2}\n")
-                self._bring_link_down(dpid1, dpid2)
+                self._bring_link_down(dpid1, dpid2, link_changes)
         
         if added_links:
             output(f"Links ADDED: {len(added_links)}\n")
             for link_key in added_links:
                 dpid1, dpid2 = link_key[0][0], link_key[1][0]
                 output(f"     - s{dpid1} <-> s{dpid2}\n")
-                self._bring_link_up(dpid1, dpid2)
+                self._bring_link_up(dpid1, dpid2, link_changes)
+        
+        self._apply_link_changes(link_changes)
         
         # 2. Handle HOST changes
         old_hosts = set(old_topology.get('hosts', {}).keys())
@@ -454,45 +600,51 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
         if added_links or removed_links or added_hosts: # Summary
             output(f"\nTwin network updated!\n")
     
-    def _bring_link_down(self, dpid1, dpid2): # Bring down a link between two switches
-        link_key = tuple(sorted([dpid1, dpid2]))
+    def _bring_link_down(self, dpid1, dpid2, changes): # Bring down a link between two switches
+        link_key = _ordered_pair(dpid1, dpid2)
         
         if link_key in self.link_map:
             link = self.link_map[link_key]
             
             # Bring down both interfaces
-            link.intf1.ifconfig('down')
-            link.intf2.ifconfig('down')
+            changes.append((link.intf1, 'down'))
+            changes.append((link.intf2, 'down'))
             
             output(f"Brought down link twin_s{dpid1} <-> twin_s{dpid2}\n")
         else:
             output(f"Link twin_s{dpid1} <-> twin_s{dpid2} not found in link map\n")
     
-    def _bring_link_up(self, dpid1, dpid2): # Bring up a link between two switches
-        link_key = tuple(sorted([dpid1, dpid2]))
+    def _bring_link_up(self, dpid1, dpid2, changes): # Bring up a link between two switches
+        link_key = _ordered_pair(dpid1, dpid2)
         
         if link_key in self.link_map:
             link = self.link_map[link_key]
             
             # Bring up both interfaces
-            link.intf1.ifconfig('up')
-            link.intf2.ifconfig('up')
+            changes.append((link.intf1, 'up'))
+            changes.append((link.intf2, 'up'))
             
             output(f"Brought up link twin_s{dpid1} <-> twin_s{dpid2}\n")
         else:
             output(f"Link twin_s{dpid1} <-> twin_s{dpid2} not found in link map\n")
     
+    def _apply_link_changes(self, changes): # Apply queued interface states in one batch
+        for intf, state in changes:
+            if self._ipr is not None: # One RTM_NEWLINK per interface on a single netlink socket
+                try:
+                    self._ipr.link('set', index=self._ifindex[intf.name], state=state)
+                    continue
+                except (NetlinkError, KeyError) as e: # Fall back for this interface only
+                    error(f"Netlink failed for {intf.name} ({e}), using ifconfig\n")
+            intf.ifconfig(state)
+    
     def _add_host_dynamically(self, mac, host_info):
         try:
             dpid = host_info.get('dpid')
             ipv4 = host_info.get('ipv4')
             
             switch_name = f"twin_s{dpid}"
-            switch = None
-            for s in self.net.switches:
-                if s.name == switch_name:
-                    switch = s
-                    break
+            switch = self._switch_by_name.get(switch_name)
             
             if not switch:
                 output(f"Switch {switch_name} not found, cannot add host\n")
@@ -527,16 +679,18 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
             
             # Update static ARP entries for all existing hosts
             ip_clean = ip_with_mask.split('/')[0]
-            for existing_host in self.net.hosts:
-                if existing_host.name != host_name:
-                    # Tell existing hosts about the new host
-                    existing_host.setARP(ip_clean, mac)
-                    # Tell the new host about existing hosts
-                    existing_ip = existing_host.IP()
-                    existing_mac = existing_host.MAC()
-                    if existing_ip and existing_mac:
-                        host.setARP(existing_ip, existing_mac)
-            
+            arp_cmds = []
+            for existing_mac, (existing_host, existing_ip) in self._host_index.items():
+                # Tell existing hosts about the new host
+                existing_host.setARP(ip_clean, mac)
+                # Tell the new host about existing hosts
+                if existing_ip and existing_mac:
+                    arp_cmds.append(f'arp -s {existing_ip} {existing_mac}')
+            
+            if arp_cmds: # Single round-trip to the new host's shell
+                host.cmd('; '.join(arp_cmds))
+            
+            self._host_index[mac] = (host, ip_clean)
             self.created_hosts[mac] = host
             
             output(f"Added host {host_name} (IP: {ip_with_mask}, MAC: {mac})\n")
@@ -546,13 +700,13 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
             output(f"Failed to add host {mac}: {e}\n")
     
     def _link_key(self, link): # Create a hashable key for a link
-        return tuple(sorted([
-            (link.get('src_dpid'), link.get('src_port')),
-            (link.get('dst_dpid'), link.get('dst_port'))
-        ]))
+        src = (link.get('src_dpid'), link.get('src_port'))
+        dst = (link.get('dst_dpid'), link.get('dst_port'))
+        return _ordered_pair(src, dst)
     
     def stop_sync(self): # Stop background sync
         self.running = False
+        self._wake.set()
         if self.sync_thread:
             self.sync_thread.join(timeout=2)
         info("Stopped topology sync\n")
@@ -567,6 +721,9 @@ class DigitalTwin: # Digital twin network with dynamic synchronization
     
     def stop(self):
         self.stop_sync()
+        _SESSION.close()
+        if self._ipr is not None:
+            self._ipr.close()
         if self.net:
             info("Stopping digital twin network\n")
             self.net.stop()
@@ -597,14 +754,10 @@ def validate_topology(topology):
 
 
 def check_controller(ip, port): # Check if controller is reachable
-    import socket
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2)
-        result = sock.connect_ex((ip, port))
-        sock.close()
-        return result == 0
-    except:
+        with socket.create_connection((ip, port), timeout=0.5):
+            return True
+    except OSError: # Refused, timeout, unreachable host or resolution failure
         return False
 
 